@@ -0,0 +1,238 @@
+# functions for finding equivalent actions across municipalities
+
+import re
+import zlib
+from itertools import combinations
+from unidecode import unidecode
+import numpy as np
+import networkx as nx
+
+MINHASH_PRIME = 2**31 - 1 # Mersenne prime; keeps products of hash coefficients and shingles inside int64
+
+def get_action_texts(nodes, text_attributes=['name','description'], node_type_key='node_type', action_node_type='action'):
+    """
+    Collects and normalizes the texts describing each action. Texts of the given
+    attributes are concatenated, HTML tags are removed, and the result is
+    normalized in the same way as municipality names in read_municipality_data
+    (diacritics and capitals removed).
+
+    Parameters:
+    -----------
+    nodes: list of dictionaries in format {node_id:{attribute_name:attribute_value}}, as
+           returned by network_construction.read_municipality_data
+    text_attributes: list of strs, node attributes that contain the action texts; the attributes
+                     must have been read with read_municipality_data (see action_attributes)
+    node_type_key: str, key under which the attribute node type is stored in the nodes
+    action_node_type: str, node type of actions
+
+    Returns:
+    --------
+    texts: dict, normalized text of each action (keys: node ids)
+    """
+    texts = {}
+    for node in nodes:
+        for node_id, node_attributes in node.items():
+            if node_attributes[node_type_key] != action_node_type:
+                continue
+            text = ' '.join([node_attributes[attribute] for attribute in text_attributes if node_attributes.get(attribute)])
+            texts[node_id] = normalize_text(text)
+    return texts
+
+def normalize_text(text):
+    """
+    Normalizes a text for similarity comparison: removes HTML tags, diacritics,
+    capitals, and punctuation, and collapses whitespace.
+
+    Parameters:
+    -----------
+    text: str, the text to normalize
+
+    Returns:
+    --------
+    text: str, the normalized text
+    """
+    text = re.sub(r'<[^>]*>', ' ', text)
+    text = unidecode(text).lower()
+    text = re.sub(r'[^a-z0-9]+', ' ', text)
+    return text.strip()
+
+def get_shingles(text, shingle_length=5):
+    """
+    Splits a text into overlapping character shingles and hashes them into integers.
+
+    Parameters:
+    -----------
+    text: str, a normalized text
+    shingle_length: int, number of characters in each shingle
+
+    Returns:
+    --------
+    shingles: set of ints, hashed shingles of the text; texts shorter than shingle_length
+              produce no shingles
+    """
+    if len(text) < shingle_length:
+        return set()
+    shingles = {zlib.crc32(text[i:i+shingle_length].encode()) % MINHASH_PRIME for i in range(len(text) - shingle_length + 1)}
+    return shingles
+
+def calculate_minhash_signatures(shingle_sets, n_hashes=128, seed=0):
+    """
+    Calculates the MinHash signature of each shingle set using n_hashes universal
+    hash functions of the form (a*x + b) mod p. The fraction of equal signature
+    elements of two sets estimates their Jaccard similarity.
+
+    Parameters:
+    -----------
+    shingle_sets: list of sets of ints, hashed shingles (see get_shingles)
+    n_hashes: int, number of hash functions, i.e. length of the signatures
+    seed: int, seed of the random number generator used to draw the hash functions;
+          signatures are comparable only if they have been calculated with the same seed
+
+    Returns:
+    --------
+    signatures: np.array of shape (len(shingle_sets), n_hashes), the MinHash signatures
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, MINHASH_PRIME, size=n_hashes, dtype=np.int64)
+    b = rng.integers(0, MINHASH_PRIME, size=n_hashes, dtype=np.int64)
+    signatures = np.full((len(shingle_sets), n_hashes), MINHASH_PRIME, dtype=np.int64)
+    for i, shingles in enumerate(shingle_sets):
+        if len(shingles) == 0:
+            continue
+        x = np.fromiter(shingles, dtype=np.int64, count=len(shingles))
+        signatures[i] = np.min((a[:, None] * x[None, :] + b[:, None]) % MINHASH_PRIME, axis=1)
+    return signatures
+
+def find_candidate_pairs(signatures, groups, n_bands=32):
+    """
+    Finds candidate pairs of similar items with locality-sensitive hashing: the signatures
+    are divided into n_bands bands, and items whose signatures are identical in at least
+    one band are considered candidates. Only pairs of items that belong to different
+    groups (e.g. municipalities) are returned.
+
+    Parameters:
+    -----------
+    signatures: np.array of shape (n_items, n_hashes), MinHash signatures (see calculate_minhash_signatures)
+    groups: list, group of each item
+    n_bands: int, number of bands; n_hashes must be divisible by n_bands. More bands
+             lower the similarity threshold above which pairs are likely to become candidates.
+
+    Returns:
+    --------
+    candidate_pairs: set of tuples, pairs (i, j), i < j, of row indices of signatures
+    """
+    n_items, n_hashes = signatures.shape
+    assert n_hashes % n_bands == 0, 'Number of hashes must be divisible by the number of bands'
+    rows_per_band = n_hashes // n_bands
+    candidate_pairs = set()
+    for band in range(n_bands):
+        buckets = {}
+        band_signatures = signatures[:, band * rows_per_band:(band + 1) * rows_per_band]
+        for i in range(n_items):
+            buckets.setdefault(band_signatures[i].tobytes(), []).append(i)
+        for bucket in buckets.values():
+            if len(bucket) < 2:
+                continue
+            for i, j in combinations(bucket, 2):
+                if groups[i] != groups[j]:
+                    candidate_pairs.add((i, j))
+    return candidate_pairs
+
+def estimate_similarity(signatures, i, j):
+    """
+    Estimates the Jaccard similarity of two items from their MinHash signatures.
+
+    Parameters:
+    -----------
+    signatures: np.array of shape (n_items, n_hashes), MinHash signatures
+    i: int, row index of the first item
+    j: int, row index of the second item
+
+    Returns:
+    --------
+    similarity: float, estimated Jaccard similarity
+    """
+    return float(np.mean(signatures[i] == signatures[j]))
+
+def match_actions(nodes_per_municipality, text_attributes=['name','description'], node_type_key='node_type', action_node_type='action', shingle_length=5, n_hashes=128, n_bands=32, similarity_threshold=0.5, seed=0):
+    """
+    Finds pairs of similar actions across municipalities. Candidate pairs are obtained with
+    MinHash and locality-sensitive hashing, which avoids comparing all pairs of actions, and
+    the candidates are filtered by their estimated Jaccard similarity. Actions whose normalized
+    text is shorter than shingle_length are not matched.
+
+    Parameters:
+    -----------
+    nodes_per_municipality: dict, nodes of each municipality (keys: municipality tags, values: lists of
+                            dictionaries in format {node_id:{attribute_name:attribute_value}})
+    text_attributes: list of strs, node attributes that contain the action texts
+    node_type_key: str, key under which the attribute node type is stored in the nodes
+    action_node_type: str, node type of actions
+    shingle_length: int, number of characters in each shingle
+    n_hashes: int, length of the MinHash signatures
+    n_bands: int, number of LSH bands
+    similarity_threshold: float, minimum estimated Jaccard similarity of matching actions
+    seed: int, seed for drawing the MinHash functions
+
+    Returns:
+    --------
+    matches: list of tuples (action_1, action_2, similarity), the matching actions; actions are identified
+             by tuples (municipality_tag, node_id) since node ids are unique only within a municipality
+    actions: list of tuples (municipality_tag, node_id), all actions, including those that weren't matched
+    """
+    actions = []
+    action_ids = []
+    shingle_sets = []
+    for municipality_tag, nodes in nodes_per_municipality.items():
+        texts = get_action_texts(nodes, text_attributes=text_attributes, node_type_key=node_type_key, action_node_type=action_node_type)
+        for node_id, text in texts.items():
+            actions.append((municipality_tag, node_id))
+            shingles = get_shingles(text, shingle_length)
+            if len(shingles) == 0: # actions without text would all match each other
+                continue
+            action_ids.append((municipality_tag, node_id))
+            shingle_sets.append(shingles)
+    signatures = calculate_minhash_signatures(shingle_sets, n_hashes=n_hashes, seed=seed)
+    groups = [municipality_tag for municipality_tag, _ in action_ids]
+    candidate_pairs = find_candidate_pairs(signatures, groups, n_bands=n_bands)
+    print('{} candidate pairs found among {} actions'.format(len(candidate_pairs), len(action_ids)))
+    matches = []
+    for i, j in sorted(candidate_pairs):
+        similarity = estimate_similarity(signatures, i, j)
+        if similarity >= similarity_threshold:
+            matches.append((action_ids[i], action_ids[j], similarity))
+    print('{} matching actions found'.format(len(matches)))
+    return matches, actions
+
+def construct_action_matching_network(nodes_per_municipality, node_type_key='node_type', action_node_type='action', municipality_key='municipality', **kwargs):
+    """
+    Constructs a cross-municipality action graph where actions of all municipalities are
+    nodes and similar actions are linked. The graph follows the conventions of
+    network_construction.construct_network so it can be passed directly to the functions
+    of network_analysis and visualization.
+
+    Parameters:
+    -----------
+    nodes_per_municipality: dict, nodes of each municipality (keys: municipality tags, values: lists of
+                            dictionaries in format {node_id:{attribute_name:attribute_value}})
+    node_type_key: str, key under which the attribute node type is stored in the nodes
+    action_node_type: str, node type of actions
+    municipality_key: str, key under which the municipality tag of each action is stored in G.nodes
+    **kwargs: further parameters of match_actions (e.g. similarity_threshold)
+
+    Returns:
+    --------
+    G: nx.Graph(), the action graph; nodes are tuples (municipality_tag, node_id), and link weights
+       (key 'weight') are the estimated Jaccard similarities
+    """
+    matches, actions = match_actions(nodes_per_municipality, node_type_key=node_type_key, action_node_type=action_node_type, **kwargs)
+    actions = set(actions)
+    G = nx.Graph()
+    for municipality_tag, nodes in nodes_per_municipality.items():
+        for node in nodes:
+            for node_id, node_attributes in node.items():
+                if (municipality_tag, node_id) in actions:
+                    G.add_node((municipality_tag, node_id), **node_attributes)
+                    G.nodes[(municipality_tag, node_id)][municipality_key] = municipality_tag
+    G.add_weighted_edges_from(matches)
+    return G
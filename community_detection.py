@@ -0,0 +1,223 @@
+# functions for detecting communities in projection graphs
+
+import multiprocessing
+import numpy as np
+
+from scipy import sparse
+
+def get_adjacency_matrix(G):
+    """
+    Constructs the sparse, symmetric adjacency matrix of an undirected network.
+
+    Parameters:
+    -----------
+    G: nx.Graph(), a network, e.g. a projection graph
+
+    Returns:
+    --------
+    A: scipy.sparse.csr_matrix, the adjacency matrix; link weights (key 'weight') are used if present
+    nodelist: list, the node corresponding to each row of A
+    """
+    nodelist = list(G.nodes())
+    node_indices = {node:i for i, node in enumerate(nodelist)}
+    rows = []
+    cols = []
+    weights = []
+    for u, v, weight in G.edges(data='weight', default=1.):
+        rows.extend([node_indices[u], node_indices[v]])
+        cols.extend([node_indices[v], node_indices[u]])
+        weights.extend([weight, weight])
+    A = sparse.csr_matrix((weights, (rows, cols)), shape=(len(nodelist), len(nodelist)), dtype=float)
+    return A, nodelist
+
+def calculate_modularity(A, communities, resolution=1.):
+    """
+    Calculates the modularity of a partition of a network.
+
+    Parameters:
+    -----------
+    A: scipy.sparse matrix, the symmetric adjacency matrix
+    communities: np.array, community index of each node
+    resolution: float, resolution parameter; values above 1 favour smaller communities
+
+    Returns:
+    --------
+    modularity: float
+    """
+    A = sparse.coo_matrix(A)
+    total_weight = A.data.sum()
+    if total_weight == 0:
+        return 0.
+    n_communities = communities.max() + 1
+    internal = communities[A.row] == communities[A.col]
+    internal_weights = np.bincount(communities[A.row[internal]], weights=A.data[internal], minlength=n_communities)
+    community_degrees = np.bincount(communities[A.row], weights=A.data, minlength=n_communities)
+    modularity = np.sum(internal_weights / total_weight - resolution * (community_degrees / total_weight)**2)
+    return float(modularity)
+
+def move_nodes(A, resolution, rng, move_probability=0.8, threshold=1e-7):
+    """
+    Local moving phase of the Louvain method, vectorized over all nodes: on each iteration, the
+    modularity gain of moving each node to each neighbouring community is calculated at once
+    from the sparse product of the adjacency and community membership matrices. Each node
+    that would gain from moving to its best neighbouring community is then moved with
+    probability move_probability; moving only a random subset prevents neighbouring nodes
+    from swapping communities back and forth. If the simultaneous moves don't increase the
+    modularity, they are rejected and move_probability is halved. Iteration stops when no node
+    gains from moving or the modularity increases less than threshold.
+
+    Parameters:
+    -----------
+    A: scipy.sparse matrix, the symmetric adjacency matrix
+    resolution: float, resolution parameter
+    rng: np.random.Generator, used for choosing the moving nodes
+    move_probability: float, probability of moving each node that would gain from moving
+    threshold: float, minimum modularity increase per iteration
+
+    Returns:
+    --------
+    communities: np.array, community index of each node (indices are consecutive)
+    improved: bool, True if the modularity increased more than threshold
+    """
+    n_nodes = A.shape[0]
+    A = sparse.coo_matrix(A)
+    degrees = np.bincount(A.row, weights=A.data, minlength=n_nodes)
+    total_weight = degrees.sum()
+    not_self = A.row != A.col
+    A_without_self_loops = sparse.csr_matrix((A.data[not_self], (A.row[not_self], A.col[not_self])), shape=(n_nodes, n_nodes))
+    communities = np.arange(n_nodes)
+    community_degrees = degrees.copy()
+    initial_modularity = modularity = calculate_modularity(A, communities, resolution)
+    while move_probability > 0.01:
+        # weights from each node to each neighbouring community, one row per node
+        memberships = sparse.csr_matrix((np.ones(n_nodes), (np.arange(n_nodes), communities)), shape=(n_nodes, n_nodes))
+        W = A_without_self_loops @ memberships
+        W.sum_duplicates()
+        n_neighbour_communities = np.diff(W.indptr)
+        rows = np.repeat(np.arange(n_nodes), n_neighbour_communities)
+        own = W.indices == communities[rows]
+        own_gains = np.bincount(rows[own], weights=W.data[own], minlength=n_nodes) - resolution * degrees * (community_degrees[communities] - degrees) / total_weight
+        gains = W.data - resolution * degrees[rows] * community_degrees[W.indices] / total_weight
+        gains[own] = -np.inf
+        # best neighbouring community of each node; ties are broken by the smallest community index
+        has_neighbours = n_neighbour_communities > 0
+        if not np.any(has_neighbours):
+            break
+        best_gains = np.full(n_nodes, -np.inf)
+        best_gains[has_neighbours] = np.maximum.reduceat(gains, W.indptr[:-1][has_neighbours])
+        is_best = np.flatnonzero(gains == best_gains[rows])
+        first = np.ones(len(is_best), dtype=bool)
+        first[1:] = rows[is_best[1:]] != rows[is_best[:-1]]
+        best_communities = communities.copy()
+        best_communities[rows[is_best[first]]] = W.indices[is_best[first]]
+        candidates = np.flatnonzero(best_gains > own_gains + 1e-10)
+        if len(candidates) == 0:
+            break
+        movers = candidates[rng.random(len(candidates)) < move_probability]
+        if len(movers) == 0:
+            continue
+        new_communities = communities.copy()
+        new_communities[movers] = best_communities[movers]
+        new_modularity = calculate_modularity(A, new_communities, resolution)
+        if new_modularity > modularity:
+            communities = new_communities
+            community_degrees = np.bincount(communities, weights=degrees, minlength=n_nodes)
+            converged = new_modularity - modularity < threshold
+            modularity = new_modularity
+            if converged:
+                break
+        else:
+            move_probability = move_probability / 2
+    _, communities = np.unique(communities, return_inverse=True)
+    return communities, modularity > initial_modularity + threshold
+
+def louvain(A, resolution=1., seed=None, move_probability=0.8):
+    """
+    Detects communities with the Louvain method operating on the sparse adjacency matrix:
+    local moving of nodes (see move_nodes) alternates with aggregating the communities into
+    nodes of a coarser network until the modularity no longer increases.
+
+    Parameters:
+    -----------
+    A: scipy.sparse matrix, the symmetric adjacency matrix
+    resolution: float, resolution parameter; values above 1 favour smaller communities
+    seed: int, seed of the random number generator used to choose the moving nodes
+    move_probability: float, probability of moving each node that would gain from moving (see move_nodes)
+
+    Returns:
+    --------
+    communities: np.array, community index of each node
+    modularity: float, modularity of the partition
+    """
+    rng = np.random.default_rng(seed)
+    A = sparse.csr_matrix(A, dtype=float)
+    communities = np.arange(A.shape[0])
+    if A.sum() == 0:
+        return communities, 0.
+    aggregated = A
+    while True:
+        level_communities, improved = move_nodes(aggregated, resolution, rng, move_probability=move_probability)
+        if not improved:
+            break
+        communities = level_communities[communities]
+        C = sparse.csr_matrix((np.ones(len(level_communities)), (np.arange(len(level_communities)), level_communities)), shape=(len(level_communities), level_communities.max() + 1))
+        aggregated = (C.T @ aggregated @ C).tocsr()
+    return communities, calculate_modularity(A, communities, resolution)
+
+def detect_communities_at_resolution(A, nodelist, resolution, seed):
+    """
+    Runs louvain and converts the result into a list of node sets.
+
+    Parameters:
+    -----------
+    A: scipy.sparse matrix, the symmetric adjacency matrix
+    nodelist: list, the node corresponding to each row of A
+    resolution: float, resolution parameter
+    seed: int, seed of the random number generator
+
+    Returns:
+    --------
+    partition: list of sets, the communities
+    modularity: float, modularity of the partition
+    """
+    communities, modularity = louvain(A, resolution=resolution, seed=seed)
+    partition = [set() for _ in range(communities.max() + 1 if len(communities) > 0 else 0)]
+    for node, community in zip(nodelist, communities):
+        partition[community].add(node)
+    return partition, modularity
+
+def detect_communities(projection_graphs, resolutions=[1.], n_workers=None, seed=None):
+    """
+    Detects communities in each given projection graph (see network_construction.create_projection_graph)
+    at each given resolution. The combinations of graphs and resolutions are processed in parallel in
+    a pool of worker processes.
+
+    Parameters:
+    -----------
+    projection_graphs: dict, projection graphs (keys: municipality tags)
+    resolutions: list of floats, resolution parameters
+    n_workers: int, number of worker processes; if None, the number of CPUs is used, and if 1, the
+               graphs are processed serially in the calling process
+    seed: int, seed of the random number generator
+
+    Returns:
+    --------
+    communities: dict, for each municipality tag a list of tuples (resolution, partition, modularity), where
+                 partition is a list of sets of nodes
+    """
+    tasks = []
+    task_tags = []
+    for municipality_tag, P in projection_graphs.items():
+        A, nodelist = get_adjacency_matrix(P)
+        for resolution in resolutions:
+            tasks.append((A, nodelist, resolution, seed))
+            task_tags.append(municipality_tag)
+    if n_workers == 1:
+        results = [detect_communities_at_resolution(*task) for task in tasks]
+    else:
+        with multiprocessing.Pool(processes=n_workers) as pool:
+            results = pool.starmap(detect_communities_at_resolution, tasks)
+    communities = {municipality_tag:[] for municipality_tag in projection_graphs}
+    for municipality_tag, (_, _, resolution, _), (partition, modularity) in zip(task_tags, tasks, results):
+        communities[municipality_tag].append((resolution, partition, modularity))
+    return communities
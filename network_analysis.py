@@ -82,13 +82,111 @@ def count_node_and_link_types(G, node_types, node_type_key):
     for link in links:
         start_node_type = nodes[link[0]][node_type_key]
         end_node_type = nodes[link[1]][node_type_key]
-        assert start_node_type + '-' + end_node_type in count.keys() or end_node_type + '-' + start_node_type in count.keys(), 'Detected unlisted link type {}'.format(start_node_type + '-' + end_node_type)
-        if start_node_type + '-' + end_node_type in count.keys():
-            count[start_node_type + '-' + end_node_type] += 1
-        else:
-            count[end_node_type + '-' + start_node_type] += 1
+        count[get_link_type(count, start_node_type, end_node_type)] += 1
     return count
 
+def get_link_type(count, start_node_type, end_node_type):
+    """
+    Finds the key of a link in a node and link type count.
+
+    Parameters:
+    -----------
+    count: dict, number of nodes of different types and links between them (see count_node_and_link_types)
+    start_node_type: str, type of the start node of the link
+    end_node_type: str, type of the end node of the link
+
+    Returns:
+    --------
+    link_type: str, key of the link type in count
+    """
+    assert start_node_type + '-' + end_node_type in count.keys() or end_node_type + '-' + start_node_type in count.keys(), 'Detected unlisted link type {}'.format(start_node_type + '-' + end_node_type)
+    if start_node_type + '-' + end_node_type in count.keys():
+        link_type = start_node_type + '-' + end_node_type
+    else:
+        link_type = end_node_type + '-' + start_node_type
+    return link_type
+
+def calculate_metric_time_series(store, node_types, node_type_key, nbins):
+    """
+    Calculates node and link type counts, degree distributions, and density for each
+    snapshot of a snapshot store (see network_construction.create_snapshot_store). The
+    metrics are calculated from scratch only for the first snapshot and then updated
+    incrementally with the delta between consecutive snapshots.
+
+    Parameters:
+    -----------
+    store: dict, the snapshot store
+    node_types: list of strs, types of nodes for which to calculate the metrics
+    node_type_key: str, key under which the attribute node type is stored in G.nodes
+    nbins: int, number of bins used to calculate the degree distributions
+
+    Returns:
+    --------
+    time_series: dict, lists of metric values, one per snapshot (keys: 'labels', 'counts',
+                 'degree_distributions', 'density'); counts are in the format returned by
+                 count_node_and_link_types and degree distributions in the format returned by
+                 calculate_degree_distributions
+    """
+    G = store['base']
+    count = count_node_and_link_types(G, node_types, node_type_key)
+    node_type_per_node = {node:node_type for node, node_type in G.nodes(data=node_type_key)}
+    links_per_node = {node:set() for node in G.nodes()}
+    for link in G.edges():
+        links_per_node[link[0]].add(link)
+        links_per_node[link[1]].add(link)
+    n_links = G.number_of_edges()
+
+    def update_link_count(link, change):
+        count[get_link_type(count, node_type_per_node[link[0]], node_type_per_node[link[1]])] += change
+
+    time_series = {'labels':store['labels'], 'counts':[], 'degree_distributions':[], 'density':[]}
+    for i in range(len(store['labels'])):
+        if i > 0:
+            delta = store['deltas'][i-1]
+            for link in delta['removed_links']:
+                update_link_count(link, -1)
+                links_per_node[link[0]].discard(link)
+                links_per_node[link[1]].discard(link)
+                n_links -= 1
+            for node in delta['removed_nodes']:
+                count[node_type_per_node.pop(node)] -= 1
+                del links_per_node[node]
+            for node, node_attributes in delta['changed_nodes'].items():
+                node_type = node_attributes[node_type_key]
+                if node_type != node_type_per_node[node]:
+                    for link in links_per_node[node]:
+                        update_link_count(link, -1)
+                    count[node_type_per_node[node]] -= 1
+                    node_type_per_node[node] = node_type
+                    assert node_type in count.keys(), 'Detected unlisted node type {}'.format(node_type)
+                    count[node_type] += 1
+                    for link in links_per_node[node]:
+                        update_link_count(link, 1)
+            for node, node_attributes in delta['added_nodes'].items():
+                node_type = node_attributes[node_type_key]
+                assert node_type in count.keys(), 'Detected unlisted node type {}'.format(node_type)
+                node_type_per_node[node] = node_type
+                links_per_node[node] = set()
+                count[node_type] += 1
+            for link in delta['added_links']:
+                update_link_count(link, 1)
+                links_per_node[link[0]].add(link)
+                links_per_node[link[1]].add(link)
+                n_links += 1
+        time_series['counts'].append(dict(count))
+        degree_distributions = []
+        for node_type in node_types:
+            degrees = [len(links) + ((node, node) in links) for node, links in links_per_node.items() if node_type_per_node[node] == node_type] # a self-loop adds 2 to the degree as in G.degree
+            if len(degrees) > 0:
+                degree_distribution, bin_centers = get_distribution(degrees, nbins)
+                degree_distributions.append((bin_centers, degree_distribution))
+            else:
+                degree_distributions.append(([],[]))
+        time_series['degree_distributions'].append(degree_distributions)
+        n_nodes = len(node_type_per_node)
+        time_series['density'].append(n_links / float(n_nodes * (n_nodes - 1)) if n_nodes > 1 else 0)
+    return time_series
+
 def calculate_density_without_linkless_nodes(G):
     """
     Calculates the density of the subgraph induced by nodes that have at least one neighbour.
@@ -106,6 +204,98 @@ def calculate_density_without_linkless_nodes(G):
     density = nx.density(P)
     return density
 
+# Uncertainty estimates
+
+def bootstrap_confidence_interval(data, statistic=np.mean, n_bootstrap=1000, confidence_level=0.95, seed=None):
+    """
+    Calculates a percentile bootstrap confidence interval of a statistic, e.g. the mean of
+    a per-municipality quantity. All bootstrap samples are drawn and evaluated at once as
+    a (n_bootstrap, len(data)) array.
+
+    Parameters:
+    -----------
+    data: a container of data points, e.g. list or np.array
+    statistic: function, the statistic; must accept an array and the keyword argument axis (e.g. np.mean, np.median)
+    n_bootstrap: int, number of bootstrap samples
+    confidence_level: float, confidence level of the interval
+    seed: int, seed of the random number generator
+
+    Returns:
+    --------
+    estimate: float, the statistic of the data
+    lower: float, lower limit of the confidence interval
+    upper: float, upper limit of the confidence interval
+    """
+    data = np.asarray(data, dtype=float)
+    assert len(data) > 0, 'Give at least one data point for calculating the confidence interval'
+    rng = np.random.default_rng(seed)
+    samples = data[rng.integers(0, len(data), size=(n_bootstrap, len(data)))]
+    bootstrap_statistics = statistic(samples, axis=1)
+    alpha = 1 - confidence_level
+    lower, upper = np.percentile(bootstrap_statistics, [100 * alpha / 2, 100 * (1 - alpha / 2)])
+    estimate = statistic(data, axis=0)
+    return float(estimate), float(lower), float(upper)
+
+def calculate_type_count_confidence_intervals(counts, statistic=np.mean, n_bootstrap=1000, confidence_level=0.95, seed=None):
+    """
+    Calculates bootstrap confidence intervals of the statistic of node and link type counts
+    across municipalities.
+
+    Parameters:
+    -----------
+    counts: dict, lists of counts of node and link types, one count per municipality (keys: types);
+            the counts of each municipality are obtained with count_node_and_link_types
+    statistic: function, the statistic (see bootstrap_confidence_interval)
+    n_bootstrap: int, number of bootstrap samples
+    confidence_level: float, confidence level of the intervals
+    seed: int, seed of the random number generator
+
+    Returns:
+    --------
+    confidence_intervals: dict, (estimate, lower, upper) of each type (keys: types)
+    """
+    confidence_intervals = {key:bootstrap_confidence_interval(counts[key], statistic=statistic, n_bootstrap=n_bootstrap, confidence_level=confidence_level, seed=seed) for key in counts}
+    return confidence_intervals
+
+def calculate_degree_distribution_confidence_intervals(G, node_types, node_type_key, nbins, n_bootstrap=1000, confidence_level=0.95, seed=None):
+    """
+    Calculates the degree distribution per node type together with pointwise confidence intervals
+    obtained by resampling the nodes of each type with replacement. The distributions use the same
+    bins as calculate_degree_distributions, and all resamples are binned at once.
+
+    Parameters:
+    -----------
+    G: nx.Graph(), a network
+    node_types: list of strs, types of nodes for which to calculate the degree distribution
+    node_type_key: str, key under which the attribute node type is stored in G.nodes
+    nbins: int, number of bins used to calculate the distribution
+    n_bootstrap: int, number of node resamples
+    confidence_level: float, confidence level of the intervals
+    seed: int, seed of the random number generator
+
+    Returns:
+    --------
+    degree_distributions: list of tuples of lists, bin centers, degree distribution, and lower and upper limits
+                          of the confidence interval of each node type in a separate tuple of four lists
+    """
+    rng = np.random.default_rng(seed)
+    alpha = 1 - confidence_level
+    degree_distributions = []
+    for node_type in node_types:
+        nodes = get_nodes_per_type(G, node_type, node_type_key)
+        if len(nodes) > 0:
+            degrees = np.array([G.degree(node) for node in nodes])
+            degree_distribution, bin_centers = get_distribution(degrees, nbins)
+            bin_edges = np.histogram_bin_edges(degrees, bins=nbins)
+            samples = degrees[rng.integers(0, len(degrees), size=(n_bootstrap, len(degrees)))]
+            bin_indices = np.digitize(samples, bin_edges[1:-1]) + nbins * np.arange(n_bootstrap)[:, None]
+            bootstrap_distributions = np.bincount(bin_indices.ravel(), minlength=n_bootstrap * nbins).reshape(n_bootstrap, nbins) / float(len(degrees))
+            lower, upper = np.percentile(bootstrap_distributions, [100 * alpha / 2, 100 * (1 - alpha / 2)], axis=0)
+            degree_distributions.append((bin_centers, degree_distribution, lower, upper))
+        else:
+            degree_distributions.append(([],[],[],[]))
+    return degree_distributions
+
 # Accessories
 
 def get_distribution(data, nbins):
@@ -1,11 +1,18 @@
 # functions for reading data and constructing networks
 
 import json
+import mmap
 import operator
+import pickle
+import struct
 from functools import reduce
 from unidecode import unidecode
 import networkx as nx
 
+CORPUS_MAGIC = b'CWNCORP1'
+CORPUS_HEADER_FORMAT = '<8sQ' # magic, length of the JSON index in bytes
+CORPUS_SECTIONS = ['nodes', 'links', 'attributes']
+
 def read_municipality_data(base_path, municipality_tag, municipality_name_key=['organization','name'], action_key='actions', action_attributes=[], indicator_level_key='indicatorLevels', indicator_type_key='level',indicator_key='indicator',indicator_attributes=[],action_to_action_link_key='relatedActions',action_to_indicator_link_key='relatedActions',action_neighbour_key='action',indicator_to_indicator_link_key='relatedCauses',indicator_neighbour_key='causalIndicator'):
     """
     Reads the climate actions and indicators of a municipality
@@ -164,7 +171,7 @@ def read_municipality_data(base_path, municipality_tag, municipality_name_key=['
 
     return nodes, links, municipality_name
 
-def construct_network(nodes, links, municipality_name='', save_path_base=''):
+def construct_network(nodes, links, municipality_name='', save_path_base='', interned_attributes=[], attribute_tables=None):
     """
     Constructs a networkx graph object from given nodes and links and saves it to a file if wanted. Note that the current version saves the network as an edgelist that doesn't preserve node attributes.
 
@@ -174,28 +181,77 @@ def construct_network(nodes, links, municipality_name='', save_path_base=''):
     links: list in edge list format (list of pairs of nodes)
     municipality_name: str, name of the municipality, used for saving the network
     save_path_base: str, base path to which save the network
+    interned_attributes: list of strs, node attributes whose values are deduplicated with
+                         intern_node_attributes before adding them to the network; the
+                         attribute tables are stored in G.graph['attribute_tables']
+    attribute_tables: dict, attribute tables returned by an earlier call (see intern_node_attributes);
+                      give the same tables when constructing the networks of several municipalities
+                      to share the interned values between them. If None, new tables are created.
 
     Returns:
     --------
     G: a networkx graph object
     """
     G = nx.DiGraph()
-    node_ids = []
-    for node in nodes:
-        node_ids.extend([i for i in node])
-    G.add_nodes_from(node_ids)
+    if len(interned_attributes) > 0:
+        nodes, attribute_tables = intern_node_attributes(nodes, interned_attributes, attribute_tables)
+        G.graph['attribute_tables'] = attribute_tables
+    G.add_nodes_from((node_id, node_attributes) for node in nodes for node_id, node_attributes in node.items())
     G.add_edges_from(links)
-    # TODO: setting the attributes could be done with set_node_attributes in networkx 3, consider upgrading
-    for node, node_id in zip(nodes, node_ids):
-        node_attributes = node[node_id]
-        for attribute in node_attributes:
-            G.nodes[node_id][attribute] = node_attributes[attribute]
     # TODO: .edg doesn't preserve node attributes; consider saving as pickle in networkx 3
     if save_path_base:
         save_path = save_path_base + '/' + municipality_name + '.edg'
         nx.write_edg(G, save_path)
     return G
 
+def intern_node_attributes(nodes, interned_attributes, attribute_tables=None):
+    """
+    Deduplicates node attribute values that repeat verbatim across nodes (e.g. categories
+    and responsible parties of actions). Each distinct value is stored once in a shared
+    table, and nodes refer to the table entry instead of holding their own copy of it. For
+    list-valued attributes, the list elements are interned separately. Attributes remain
+    accessible as before, e.g. through G.nodes[node_id].
+
+    Parameters:
+    -----------
+    nodes: list of dictionaries in format {node_id:{attribute_name:attribute_value}}
+    interned_attributes: list of strs, names of the attributes to intern
+    attribute_tables: dict, existing attribute tables to intern into, e.g. the tables returned when
+                      interning the nodes of another municipality; updated in place. If None,
+                      new tables are created.
+
+    Returns:
+    --------
+    interned_nodes: list of dictionaries in format {node_id:{attribute_name:attribute_value}}, where
+                    the values of interned attributes are references to attribute_tables
+    attribute_tables: dict, distinct values of each interned attribute (keys: attribute names, values: dicts
+                      of the values keyed by their canonical JSON encoding)
+    """
+    if attribute_tables is None:
+        attribute_tables = {}
+    for attribute in interned_attributes:
+        attribute_tables.setdefault(attribute, {})
+
+    def intern_value(attribute, value):
+        return attribute_tables[attribute].setdefault(json.dumps(value, sort_keys=True), value)
+
+    interned_nodes = []
+    for node in nodes:
+        interned_node = {}
+        for node_id, node_attributes in node.items():
+            node_attributes = dict(node_attributes)
+            for attribute in interned_attributes:
+                if attribute not in node_attributes:
+                    continue
+                value = node_attributes[attribute]
+                if isinstance(value, list):
+                    node_attributes[attribute] = [intern_value(attribute, element) for element in value]
+                else:
+                    node_attributes[attribute] = intern_value(attribute, value)
+            interned_node[node_id] = node_attributes
+        interned_nodes.append(interned_node)
+    return interned_nodes, attribute_tables
+
 def create_projection_graph(G, spanning_node_type, node_type_key, save_path_base='', save_name=''):
     """
     Creates the projection graph of given node type. A projection
@@ -235,4 +291,278 @@ def create_projection_graph(G, spanning_node_type, node_type_key, save_path_base
 
     
 
+def write_corpus(municipality_data, corpus_path, node_type_key='node_type'):
+    """
+    Writes the data of several municipalities into a single corpus file.
+    The file starts with an index of the byte offsets of each municipality and each
+    section (nodes, links, attributes), so that any municipality or section can be read
+    later with read_corpus without parsing the rest of the file.
+
+    File layout: magic bytes and index length (see CORPUS_HEADER_FORMAT), JSON index,
+    and the JSON-encoded sections. Offsets in the index are relative to the end of the index.
+    The nodes section contains pairs [node_id, node_type], the links section the edge list,
+    and the attributes section a list of the remaining node attributes of each node, aligned
+    with the nodes section.
+
+    Parameters:
+    -----------
+    municipality_data: dict, (nodes, links, municipality_name) of each municipality (keys: municipality tags)
+                       as returned by read_municipality_data
+    corpus_path: str, path to which to save the corpus
+    node_type_key: str, key under which the attribute node type is stored in the nodes
+
+    Returns:
+    --------
+    index: dict, the index of the corpus
+    """
+    index = {}
+    blocks = []
+    offset = 0
+    for municipality_tag, (nodes, links, municipality_name) in municipality_data.items():
+        node_list = []
+        attributes = []
+        for node in nodes:
+            for node_id, node_attributes in node.items():
+                node_list.append([node_id, node_attributes[node_type_key]])
+                attributes.append({key:value for key, value in node_attributes.items() if key != node_type_key})
+        section_data = {'nodes':node_list, 'links':links, 'attributes':attributes}
+        sections = {}
+        for section in CORPUS_SECTIONS:
+            block = json.dumps(section_data[section]).encode('utf-8')
+            sections[section] = [offset, len(block)]
+            blocks.append(block)
+            offset += len(block)
+        index[municipality_tag] = {'municipality_name':municipality_name, 'sections':sections}
+    index = {'node_type_key':node_type_key, 'tags':index}
+    encoded_index = json.dumps(index).encode('utf-8')
+    with open(corpus_path, 'wb') as f:
+        f.write(struct.pack(CORPUS_HEADER_FORMAT, CORPUS_MAGIC, len(encoded_index)))
+        f.write(encoded_index)
+        for block in blocks:
+            f.write(block)
+    return index
+
+def read_corpus_index(corpus_path):
+    """
+    Reads the index of a corpus file written with write_corpus.
+
+    Parameters:
+    -----------
+    corpus_path: str, path of the corpus file
+
+    Returns:
+    --------
+    index: dict, the index of the corpus
+    data_start: int, byte position where the section data starts
+    """
+    with open(corpus_path, 'rb') as f:
+        magic, index_length = struct.unpack(CORPUS_HEADER_FORMAT, f.read(struct.calcsize(CORPUS_HEADER_FORMAT)))
+        assert magic == CORPUS_MAGIC, '{} is not a corpus file, check the path'.format(corpus_path)
+        index = json.loads(f.read(index_length).decode('utf-8'))
+    data_start = struct.calcsize(CORPUS_HEADER_FORMAT) + index_length
+    return index, data_start
+
+def read_corpus(corpus_path, municipality_tags=[], sections=CORPUS_SECTIONS, node_types=[]):
+    """
+    Reads the data of the given municipalities from a corpus file written with write_corpus.
+    The file is memory-mapped and only the requested sections of the requested
+    municipalities are parsed. The output can be passed directly to construct_network.
+
+    Parameters:
+    -----------
+    corpus_path: str, path of the corpus file
+    municipality_tags: list of strs, tags of the municipalities to read; if empty, all municipalities
+                       are read
+    sections: list of strs, sections to read; the nodes section is always read. If 'links' is
+              not given, the returned link lists are empty, and if 'attributes' is not given,
+              nodes only have the node type attribute.
+    node_types: list of strs, node types to read (e.g. ['action'] for the action subgraphs); if
+                empty, nodes of all types are read. Links with an endpoint of another type are
+                omitted.
+
+    Returns:
+    --------
+    data: dict, (nodes, links, municipality_name) of each municipality (keys: municipality tags) in the
+          format returned by read_municipality_data
+    """
+    for section in sections:
+        assert section in CORPUS_SECTIONS, 'Unknown corpus section {}, options: {}'.format(section, CORPUS_SECTIONS)
+    index, data_start = read_corpus_index(corpus_path)
+    node_type_key = index['node_type_key']
+    if len(municipality_tags) == 0:
+        municipality_tags = list(index['tags'].keys())
+    data = {}
+    with open(corpus_path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as corpus:
+
+            def read_section(municipality_tag, section):
+                offset, length = index['tags'][municipality_tag]['sections'][section]
+                start = data_start + offset
+                return json.loads(corpus[start:start + length].decode('utf-8'))
+
+            for municipality_tag in municipality_tags:
+                assert municipality_tag in index['tags'], 'Municipality tag {} not found in the corpus'.format(municipality_tag)
+                node_list = read_section(municipality_tag, 'nodes')
+                if 'attributes' in sections:
+                    attributes = read_section(municipality_tag, 'attributes')
+                else:
+                    attributes = [{} for _ in node_list]
+                nodes = []
+                node_ids = set()
+                for (node_id, node_type), node_attributes in zip(node_list, attributes):
+                    if len(node_types) > 0 and node_type not in node_types:
+                        continue
+                    node_attributes[node_type_key] = node_type
+                    nodes.append({node_id:node_attributes})
+                    node_ids.add(node_id)
+                if 'links' in sections:
+                    links = [tuple(link) for link in read_section(municipality_tag, 'links') if link[0] in node_ids and link[1] in node_ids]
+                else:
+                    links = []
+                data[municipality_tag] = (nodes, links, index['tags'][municipality_tag]['municipality_name'])
+    return data
+
+def calculate_graph_delta(G_old, G_new):
+    """
+    Calculates the changes in nodes, node attributes, and links between two versions of a network.
+
+    Parameters:
+    -----------
+    G_old: nx.DiGraph(), the earlier version of the network
+    G_new: nx.DiGraph(), the later version of the network
+
+    Returns:
+    --------
+    delta: dict, the changes: 'added_nodes' and 'changed_nodes' contain the full attributes
+           of each added or changed node ({node_id:{attribute_name:attribute_value}}),
+           'removed_nodes' is a list of node ids, and 'added_links' and 'removed_links'
+           are edge lists. Links of removed nodes are listed in 'removed_links'.
+           'graph_attributes' contains the graph attributes (G.graph) of the later version,
+           except the attribute tables shared with other networks (see construct_network).
+    """
+    old_nodes = G_old.nodes
+    new_nodes = G_new.nodes
+    delta = {'added_nodes':{node:dict(new_nodes[node]) for node in new_nodes if node not in old_nodes},
+             'removed_nodes':[node for node in old_nodes if node not in new_nodes],
+             'changed_nodes':{node:dict(new_nodes[node]) for node in new_nodes if node in old_nodes and new_nodes[node] != old_nodes[node]},
+             'added_links':[link for link in G_new.edges() if not G_old.has_edge(*link)],
+             'removed_links':[link for link in G_old.edges() if not G_new.has_edge(*link)],
+             'graph_attributes':{key:value for key, value in G_new.graph.items() if key != 'attribute_tables'}}
+    return delta
+
+def apply_graph_delta(G, delta):
+    """
+    Applies the changes calculated with calculate_graph_delta to a network in place.
+
+    Parameters:
+    -----------
+    G: nx.DiGraph(), the earlier version of the network
+    delta: dict, the changes (see calculate_graph_delta)
+
+    Returns:
+    --------
+    G: nx.DiGraph(), the later version of the network
+    """
+    G.remove_edges_from(delta['removed_links'])
+    G.remove_nodes_from(delta['removed_nodes'])
+    for node, node_attributes in delta['changed_nodes'].items():
+        G.nodes[node].clear()
+        G.nodes[node].update(node_attributes)
+    G.add_nodes_from(delta['added_nodes'].items())
+    G.add_edges_from(delta['added_links'])
+    G.graph.clear()
+    G.graph.update(delta['graph_attributes'])
+    return G
+
+def copy_without_attribute_tables(G):
+    """
+    Copies a network without the attribute tables stored in G.graph (see construct_network). The tables
+    may be shared by the networks of all municipalities, so they aren't stored with a single network;
+    node attributes still refer to the interned values.
+
+    Parameters:
+    -----------
+    G: nx.DiGraph(), the network
+
+    Returns:
+    --------
+    G_copy: nx.DiGraph(), the copy
+    """
+    G_copy = G.copy()
+    G_copy.graph.pop('attribute_tables', None)
+    return G_copy
+
+def create_snapshot_store(graphs, snapshot_labels, checkpoint_interval=10, save_path='', metadata={}):
+    """
+    Stores successive versions (snapshots) of a plan as the first network and the deltas
+    between consecutive snapshots. Every checkpoint_interval-th snapshot is also stored
+    in full to keep the reconstruction of late snapshots fast. Attribute tables shared
+    with other networks are left out of the stored networks (see copy_without_attribute_tables).
+
+    Parameters:
+    -----------
+    graphs: list of nx.DiGraph(), the snapshots in temporal order
+    snapshot_labels: list of strs, labels of the snapshots (e.g. municipality tags)
+    checkpoint_interval: int, number of deltas between stored full snapshots
+    save_path: str, path to which to save the store as pickle; if empty, the store is not saved
+    metadata: dict, stored as such in the store, e.g. the parameters used for constructing the snapshots
+              for checking if a saved store is still valid
+
+    Returns:
+    --------
+    store: dict, the snapshot store with keys 'labels', 'base', 'deltas', 'checkpoints', and 'metadata'
+    """
+    assert len(graphs) == len(snapshot_labels), "Number of graphs and snapshot labels don't match"
+    assert len(graphs) > 0, 'Give at least one graph for the snapshot store'
+    store = {'labels':list(snapshot_labels), 'base':copy_without_attribute_tables(graphs[0]), 'deltas':[], 'checkpoints':{}, 'metadata':dict(metadata)}
+    for i in range(1, len(graphs)):
+        store['deltas'].append(calculate_graph_delta(graphs[i-1], graphs[i]))
+        if i % checkpoint_interval == 0:
+            store['checkpoints'][i] = copy_without_attribute_tables(graphs[i])
+    if save_path:
+        with open(save_path, 'wb') as f:
+            pickle.dump(store, f)
+    return store
+
+def read_snapshot_store(path):
+    """
+    Reads a snapshot store saved with create_snapshot_store.
+
+    Parameters:
+    -----------
+    path: str, path of the saved store
+
+    Returns:
+    --------
+    store: dict, the snapshot store
+    """
+    with open(path, 'rb') as f:
+        store = pickle.load(f)
+    return store
 
+def reconstruct_snapshot(store, snapshot_label):
+    """
+    Reconstructs a snapshot from a snapshot store by applying deltas to the closest
+    earlier full snapshot.
+
+    Parameters:
+    -----------
+    store: dict, the snapshot store (see create_snapshot_store)
+    snapshot_label: str, label of the snapshot to reconstruct
+
+    Returns:
+    --------
+    G: nx.DiGraph(), the snapshot
+    """
+    assert snapshot_label in store['labels'], 'Snapshot {} not found in the store'.format(snapshot_label)
+    index = store['labels'].index(snapshot_label)
+    checkpoints = [checkpoint for checkpoint in store['checkpoints'] if checkpoint <= index]
+    if len(checkpoints) > 0:
+        start = max(checkpoints)
+        G = store['checkpoints'][start].copy()
+    else:
+        start = 0
+        G = store['base'].copy()
+    for delta in store['deltas'][start:index]:
+        apply_graph_delta(G, delta)
+    return G
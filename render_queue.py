@@ -0,0 +1,216 @@
+# functions for queueing figures and rendering them in parallel
+
+import hashlib
+import json
+import os
+import multiprocessing
+import importlib.util
+import numpy as np
+import networkx as nx
+
+VISUALIZATION_PATH = '/home/onerva/projects/climate_watch/climate-watch-nets/visualization.py'
+NETWORK_ANALYSIS_PATH = '/home/onerva/projects/climate_watch/climate-watch-nets/network_analysis.py' # used by visualization, e.g. for logarithmic bins
+
+visualization = None # loaded separately in each worker process, see init_worker
+code_digest = None # hash of the code of visualization and network_analysis, see calculate_code_digest
+
+def create_render_job(plot_function, **kwargs):
+    """
+    Creates a job for rendering a figure with a function of visualization. The job is keyed by
+    a hash of the function name, the code of visualization and network_analysis, and all parameters (including
+    the data to plot), so the key changes if and only if the figure would change.
+
+    Parameters:
+    -----------
+    plot_function: str, name of the plotting function in visualization ('draw_network',
+                   'plot_curves', or 'create_histogram')
+    **kwargs: parameters of the plotting function; the output path must be given, either as
+              save_path or as save_path_base and save_name
+
+    Returns:
+    --------
+    job: dict, the job with keys 'plot_function', 'kwargs', 'output_path', and 'key'
+    """
+    job = {'plot_function':plot_function, 'kwargs':kwargs}
+    job['output_path'] = get_output_path(job)
+    job['key'] = calculate_job_key(job)
+    return job
+
+def get_output_path(job):
+    """
+    Returns the path of the file to which a render job saves its figure.
+
+    Parameters:
+    -----------
+    job: dict, a render job (see create_render_job)
+
+    Returns:
+    --------
+    output_path: str
+    """
+    kwargs = job['kwargs']
+    if kwargs.get('save_path'):
+        output_path = kwargs['save_path']
+    else:
+        assert kwargs.get('save_path_base') and kwargs.get('save_name'), 'Give a save path for each render job'
+        output_path = kwargs['save_path_base'] + '/' + kwargs['save_name']
+    return output_path
+
+def calculate_code_digest():
+    """
+    Calculates the hash of the code of visualization and network_analysis. The digest is
+    calculated once and then reused for all jobs (see calculate_job_key).
+
+    Returns:
+    --------
+    digest: bytes, SHA-256 digest
+    """
+    global code_digest
+    if code_digest is None:
+        h = hashlib.sha256()
+        for path in [VISUALIZATION_PATH, NETWORK_ANALYSIS_PATH]:
+            with open(path, 'rb') as f:
+                h.update(f.read())
+        code_digest = h.digest()
+    return code_digest
+
+def calculate_job_key(job):
+    """
+    Calculates the hash key of a render job.
+
+    Parameters:
+    -----------
+    job: dict, a render job (see create_render_job)
+
+    Returns:
+    --------
+    key: str, hexadecimal SHA-256 digest
+    """
+    h = hashlib.sha256()
+    h.update(calculate_code_digest())
+    h.update(job['plot_function'].encode('utf-8'))
+    update_hash(h, job['kwargs'])
+    return h.hexdigest()
+
+def update_hash(h, value):
+    """
+    Updates a hash object with a canonical representation of the value. Networks are
+    represented by their nodes, node attributes, and links, and arrays by their bytes.
+
+    Parameters:
+    -----------
+    h: hashlib hash object
+    value: the value to add to the hash
+
+    Returns:
+    --------
+    No direct output, updates h in place
+    """
+    if isinstance(value, nx.Graph):
+        h.update(b'graph')
+        update_hash(h, sorted([(repr(node), repr(sorted(data.items(), key=repr))) for node, data in value.nodes(data=True)]))
+        update_hash(h, sorted([(repr(edge[0]), repr(edge[1]), repr(sorted(edge[2].items(), key=repr))) for edge in value.edges(data=True)]))
+    elif isinstance(value, np.ndarray):
+        h.update(b'array')
+        h.update(str(value.dtype).encode('utf-8') + str(value.shape).encode('utf-8'))
+        h.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, dict):
+        h.update(b'dict')
+        for key in sorted(value.keys(), key=repr):
+            h.update(repr(key).encode('utf-8'))
+            update_hash(h, value[key])
+    elif isinstance(value, (list, tuple)):
+        h.update(b'list' + str(len(value)).encode('utf-8'))
+        for element in value:
+            update_hash(h, element)
+    else:
+        h.update(repr(value).encode('utf-8'))
+
+def init_worker():
+    """
+    Initializes a render worker process: selects a non-interactive matplotlib backend and
+    loads visualization.
+    """
+    global visualization
+    import matplotlib
+    matplotlib.use('Agg')
+    spec = importlib.util.spec_from_file_location('visualization', VISUALIZATION_PATH)
+    visualization = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(visualization)
+
+def render_job(job):
+    """
+    Renders the figure of a render job.
+
+    Parameters:
+    -----------
+    job: dict, a render job (see create_render_job)
+
+    Returns:
+    --------
+    output_path: str, path of the rendered figure
+    key: str, hash key of the job
+    """
+    getattr(visualization, job['plot_function'])(**job['kwargs'])
+    return job['output_path'], job['key']
+
+def to_preview_job(job, preview_format='png'):
+    """
+    Creates a raster-format copy of a render job for quick previews. The preview is saved next to
+    the original output with the file extension replaced.
+
+    Parameters:
+    -----------
+    job: dict, a render job (see create_render_job)
+    preview_format: str, raster file format of the preview
+
+    Returns:
+    --------
+    preview_job: dict, the preview render job
+    """
+    kwargs = dict(job['kwargs'])
+    kwargs['save_format'] = preview_format
+    if kwargs.get('save_path'):
+        kwargs['save_path'] = os.path.splitext(kwargs['save_path'])[0] + '.' + preview_format
+    else:
+        kwargs['save_name'] = os.path.splitext(kwargs['save_name'])[0] + '.' + preview_format
+    return create_render_job(job['plot_function'], **kwargs)
+
+def run_render_queue(jobs, manifest_path, n_workers=None, preview=False, preview_format='png'):
+    """
+    Renders the figures of the given jobs, skipping figures whose output file exists and was
+    rendered from identical inputs. The keys of rendered figures are stored in a manifest file.
+    The remaining jobs are rendered in parallel in a pool of worker processes.
+
+    Parameters:
+    -----------
+    jobs: list of dicts, render jobs (see create_render_job)
+    manifest_path: str, path of the .json file that stores the key of each rendered figure
+    n_workers: int, number of worker processes; if None, the number of CPUs is used
+    preview: bool, if True, figures are rendered in preview_format instead of the format of the job
+    preview_format: str, raster file format of the previews
+
+    Returns:
+    --------
+    rendered: list of strs, paths of the rendered figures
+    """
+    if preview:
+        jobs = [to_preview_job(job, preview_format) for job in jobs]
+    if os.path.isfile(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    else:
+        manifest = {}
+    pending = [job for job in jobs if not (os.path.isfile(job['output_path']) and manifest.get(job['output_path']) == job['key'])]
+    print('Rendering {} figures, {} up to date'.format(len(pending), len(jobs) - len(pending)))
+    rendered = []
+    if len(pending) > 0:
+        try:
+            with multiprocessing.Pool(processes=n_workers, initializer=init_worker) as pool:
+                for output_path, key in pool.imap_unordered(render_job, pending):
+                    manifest[output_path] = key
+                    rendered.append(output_path)
+        finally: # keeping the figures rendered before a possible failure up to date
+            with open(manifest_path, 'w') as f:
+                json.dump(manifest, f, indent=1)
+    return rendered
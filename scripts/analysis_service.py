@@ -0,0 +1,199 @@
+# A long-running local service that keeps the networks of all municipalities and their analysis
+# results in memory and answers analysis queries over HTTP. The .json files are checked for changes
+# on each query and only the municipalities whose data has changed are reloaded.
+#
+# Example queries (the service listens on params.service_host:params.service_port):
+# /tags
+# /degree_distribution?tag=espoo-ilmasto&node_type=action
+# /type_counts?tag=espoo-ilmasto
+# /projection_density?tag=espoo-ilmasto&node_type=action
+
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+import networkx as nx
+
+# importing modules from climate-watch-nets with importlib to ensure that it's imported from the right path
+import importlib.util
+
+spec = importlib.util.spec_from_file_location('parameters','/home/onerva/projects/climate_watch/climate-watch-nets/scripts/parameters.py')
+params = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(params)
+
+spec = importlib.util.spec_from_file_location('network_construction','/home/onerva/projects/climate_watch/climate-watch-nets/network_construction.py')
+nc = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(nc)
+
+spec = importlib.util.spec_from_file_location('network_analysis','/home/onerva/projects/climate_watch/climate-watch-nets/network_analysis.py')
+na = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(na)
+
+data_folder = params.data_folder
+municipality_tags = params.municipality_tags
+municipality_name_key = params.municipality_name_key
+action_key = params.action_key
+action_attributes = params.action_attributes
+action_to_action_link_key = params.action_to_action_link_key
+indicator_level_key = params.indicator_level_key
+indicator_type_key = params.indicator_type_key
+indicator_key = params.indicator_key
+indicator_attributes = params.indicator_attributes
+action_to_indicator_link_key = params.action_to_indicator_link_key
+action_neighbour_key = params.action_neighbour_key
+indicator_to_indicator_link_key = params.indicator_to_indicator_link_key
+indicator_neighbour_key = params.indicator_neighbour_key
+interned_attributes = params.interned_attributes
+attribute_tables = {} # shared by the networks of all municipalities; pruned after each reload, see prune_attribute_tables
+
+node_type_key = params.node_type_key
+node_types = params.node_types
+projection_graph_spanning_node_types = params.projection_graph_spanning_node_types
+n_degree_bins = params.n_degree_bins
+
+service_host = params.service_host
+service_port = params.service_port
+
+loaded = {} # analysis state of each municipality (keys: municipality tags)
+failed = {} # modification times and error message of municipalities whose latest reload failed (keys: municipality tags)
+lock = threading.Lock()
+
+def get_modification_times(municipality_tag):
+    """
+    Returns the modification times of the .json files of a municipality tag
+    (tags of format 'municipality1+...+municipalityN' have several files).
+    """
+    return [os.path.getmtime(data_folder + '/' + tag + '.json') for tag in municipality_tag.split('+')]
+
+def load_municipality(municipality_tag, modification_times):
+    """
+    Reads the data of a municipality, constructs the network and its projection graphs, and
+    precomputes the analysis results served by the service.
+    """
+    nodes,links,_ = nc.read_municipality_data(data_folder, municipality_tag, municipality_name_key=municipality_name_key, action_key=action_key, action_attributes=action_attributes, indicator_level_key=indicator_level_key, indicator_type_key=indicator_type_key, indicator_key=indicator_key, indicator_attributes=indicator_attributes, action_to_indicator_link_key=action_to_indicator_link_key, action_neighbour_key= action_neighbour_key, indicator_to_indicator_link_key=indicator_to_indicator_link_key, indicator_neighbour_key=indicator_neighbour_key)
+    G = nc.construct_network(nodes, links, municipality_tag, interned_attributes=interned_attributes, attribute_tables=attribute_tables)
+    degree_distributions = na.calculate_degree_distributions(G, node_types, node_type_key, n_degree_bins)
+    projection_densities = {}
+    projections = {}
+    for spanning_node_type in projection_graph_spanning_node_types:
+        P = nc.create_projection_graph(G, spanning_node_type, node_type_key)
+        projections[spanning_node_type] = P
+        projection_densities[spanning_node_type] = {'density':nx.density(P), 'density_without_linkless':na.calculate_density_without_linkless_nodes(P)}
+    loaded[municipality_tag] = {'modification_times':modification_times,
+                                'G':G,
+                                'projections':projections,
+                                'degree_distributions':{node_type:(np.asarray(bin_centers).tolist(), np.asarray(pdf).tolist()) for node_type, (bin_centers, pdf) in zip(node_types, degree_distributions)},
+                                'counts':na.count_node_and_link_types(G, node_types, node_type_key),
+                                'projection_densities':projection_densities}
+
+def prune_attribute_tables():
+    """
+    Rebuilds the shared attribute tables from the attribute values of the currently loaded networks,
+    so that the values of earlier versions of reloaded municipalities are freed. The tables are
+    updated in place since each network refers to them in G.graph['attribute_tables'].
+    """
+    tables = {}
+    for state in loaded.values():
+        nc.intern_node_attributes([{node:node_attributes} for node, node_attributes in state['G'].nodes(data=True)], interned_attributes, tables)
+    attribute_tables.clear()
+    attribute_tables.update(tables)
+
+def reload_changed():
+    """
+    Reloads the municipalities whose .json files have changed since they were loaded. If the
+    files of a municipality are missing or can't be read (e.g. they are being written), the
+    last successfully loaded state is kept and the error is stored in failed. A failed reload is
+    retried only after the files change again.
+
+    Returns:
+    --------
+    reloaded: list of strs, tags of the reloaded municipalities
+    states: dict, analysis state of each loaded municipality (a copy of loaded taken while holding the lock)
+    errors: dict, error message of each municipality whose latest reload failed
+    """
+    reloaded = []
+    with lock:
+        for municipality_tag in municipality_tags:
+            modification_times = None
+            try:
+                modification_times = get_modification_times(municipality_tag)
+                if municipality_tag in loaded and loaded[municipality_tag]['modification_times'] == modification_times:
+                    failed.pop(municipality_tag, None)
+                    continue
+                if municipality_tag in failed and failed[municipality_tag][0] == modification_times:
+                    continue
+                load_municipality(municipality_tag, modification_times)
+                failed.pop(municipality_tag, None)
+                reloaded.append(municipality_tag)
+            except Exception as e:
+                failed[municipality_tag] = (modification_times, 'Loading {} failed: {}'.format(municipality_tag, e))
+                print(failed[municipality_tag][1])
+        if len(reloaded) > 0:
+            prune_attribute_tables()
+        states = dict(loaded)
+        errors = {municipality_tag:error for municipality_tag, (_, error) in failed.items()}
+    return reloaded, states, errors
+
+def answer_query(path, query):
+    """
+    Answers an analysis query.
+
+    Parameters:
+    -----------
+    path: str, the query type ('/tags', '/degree_distribution', '/type_counts', '/projection_density', '/reload')
+    query: dict, query parameters as returned by urllib.parse.parse_qs
+
+    Returns:
+    --------
+    status: int, HTTP status code
+    response: dict, the answer
+    """
+    reloaded, states, errors = reload_changed()
+    if path == '/reload':
+        if len(errors) > 0:
+            return 500, {'reloaded':reloaded, 'errors':errors}
+        return 200, {'reloaded':reloaded}
+    if path == '/tags':
+        return 200, {'tags':list(states.keys()), 'errors':errors}
+    tag = query.get('tag', [''])[0]
+    if tag in errors:
+        return 500, {'error':errors[tag]}
+    if tag not in states:
+        return 404, {'error':'Unknown municipality tag {}'.format(tag)}
+    state = states[tag]
+    if path == '/type_counts':
+        return 200, {'tag':tag, 'counts':state['counts']}
+    node_type = query.get('node_type', [''])[0]
+    if path == '/degree_distribution':
+        if node_type not in state['degree_distributions']:
+            return 404, {'error':'Unknown node type {}'.format(node_type)}
+        bin_centers, pdf = state['degree_distributions'][node_type]
+        return 200, {'tag':tag, 'node_type':node_type, 'bin_centers':bin_centers, 'pdf':pdf}
+    if path == '/projection_density':
+        if node_type not in state['projection_densities']:
+            return 404, {'error':'No projection graph for node type {}, check projection_graph_spanning_node_types'.format(node_type)}
+        return 200, dict(tag=tag, node_type=node_type, **state['projection_densities'][node_type])
+    return 404, {'error':'Unknown query {}'.format(path)}
+
+class AnalysisRequestHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        try:
+            status, response = answer_query(url.path, parse_qs(url.query))
+        except Exception as e:
+            status, response = 500, {'error':str(e)}
+        body = json.dumps(response).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+reload_changed()
+server = ThreadingHTTPServer((service_host, service_port), AnalysisRequestHandler)
+print('Serving analysis queries at http://{}:{}'.format(service_host, service_port))
+server.serve_forever()
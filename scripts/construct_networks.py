@@ -24,7 +24,15 @@ action_to_indicator_link_key = params.action_to_indicator_link_key
 action_neighbour_key = params.action_neighbour_key
 indicator_to_indicator_link_key = params.indicator_to_indicator_link_key
 indicator_neighbour_key = params.indicator_neighbour_key
+interned_attributes = params.interned_attributes
+attribute_tables = {} # shared by the networks of all municipalities
+corpus_path = params.corpus_path
 
+municipality_data = {}
 for municipality_tag in municipality_tags:
-    nodes,links,_ = nc.read_municipality_data(path_base, municipality_tag, municipality_name_key=municipality_name_key, action_key=action_key, action_attributes=action_attributes, indicator_level_key=indicator_level_key, indicator_type_key=indicator_type_key, indicator_key=indicator_key, indicator_attributes=indicator_attributes, action_to_indicator_link_key=action_to_indicator_link_key, action_neighbour_key= action_neighbour_key, indicator_to_indicator_link_key=indicator_to_indicator_link_key, indicator_neighbour_key=indicator_neighbour_key)
-    _ = nc.construct_network(nodes, links, municipality_tag, save_path_base=path_base)
+    nodes,links,municipality_name = nc.read_municipality_data(path_base, municipality_tag, municipality_name_key=municipality_name_key, action_key=action_key, action_attributes=action_attributes, indicator_level_key=indicator_level_key, indicator_type_key=indicator_type_key, indicator_key=indicator_key, indicator_attributes=indicator_attributes, action_to_indicator_link_key=action_to_indicator_link_key, action_neighbour_key= action_neighbour_key, indicator_to_indicator_link_key=indicator_to_indicator_link_key, indicator_neighbour_key=indicator_neighbour_key)
+    _ = nc.construct_network(nodes, links, municipality_tag, save_path_base=path_base, interned_attributes=interned_attributes, attribute_tables=attribute_tables)
+    municipality_data[municipality_tag] = (nodes, links, municipality_name)
+
+# writing all municipalities into a single indexed corpus file for fast partial reading
+_ = nc.write_corpus(municipality_data, corpus_path)
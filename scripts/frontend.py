@@ -2,6 +2,8 @@
 # For a script for reading the data and constructing networks, see
 # construct_networks.py
 
+import os
+import sys
 import networkx as nx
 
 # importing modules from climate-watch-nets with importlib to ensure that it's imported from the right path
@@ -19,10 +21,24 @@ spec = importlib.util.spec_from_file_location('network_analysis','/home/onerva/p
 na = importlib.util.module_from_spec(spec)
 spec.loader.exec_module(na)
 
+spec = importlib.util.spec_from_file_location('action_matching','/home/onerva/projects/climate_watch/climate-watch-nets/action_matching.py')
+am = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(am)
+
+spec = importlib.util.spec_from_file_location('community_detection','/home/onerva/projects/climate_watch/climate-watch-nets/community_detection.py')
+cd = importlib.util.module_from_spec(spec)
+sys.modules['community_detection'] = cd # worker processes look up the module by name when receiving tasks
+spec.loader.exec_module(cd)
+
 spec = importlib.util.spec_from_file_location('visualization','/home/onerva/projects/climate_watch/climate-watch-nets/visualization.py')
 vis = importlib.util.module_from_spec(spec)
 spec.loader.exec_module(vis)
 
+spec = importlib.util.spec_from_file_location('render_queue','/home/onerva/projects/climate_watch/climate-watch-nets/render_queue.py')
+rq = importlib.util.module_from_spec(spec)
+sys.modules['render_queue'] = rq # render worker processes look up the module by name when receiving jobs
+spec.loader.exec_module(rq)
+
 data_folder = params.data_folder
 municipality_tags = params.municipality_tags
 #municipality_tags = ['helsinki-kierto']
@@ -38,6 +54,10 @@ action_to_indicator_link_key = params.action_to_indicator_link_key
 action_neighbour_key = params.action_neighbour_key
 indicator_to_indicator_link_key = params.indicator_to_indicator_link_key
 indicator_neighbour_key = params.indicator_neighbour_key
+interned_attributes = params.interned_attributes
+attribute_tables = {} # shared by the networks of all municipalities
+corpus_path = params.corpus_path
+use_corpus = params.use_corpus
 
 node_type_key = params.node_type_key
 node_types = params.node_types
@@ -47,6 +67,20 @@ n_type_histogram_bins = params.n_type_histogram_bins
 n_projection_graph_density_bins = params.n_projection_graph_density_bins
 node_and_link_type_histogram_bin_type = params.node_and_link_type_histogram_bin_type
 projection_graph_density_bin_type = params.projection_graph_density_bin_type
+plan_snapshot_tags = params.plan_snapshot_tags
+snapshot_store_save_base = params.snapshot_store_save_name
+community_resolutions = params.community_resolutions
+n_bootstrap = params.n_bootstrap
+confidence_level = params.confidence_level
+bootstrap_seed = params.bootstrap_seed
+n_community_detection_workers = params.n_community_detection_workers
+community_detection_seed = params.community_detection_seed
+
+action_matching_text_attributes = params.action_matching_text_attributes
+action_matching_shingle_length = params.action_matching_shingle_length
+action_matching_n_hashes = params.action_matching_n_hashes
+action_matching_n_bands = params.action_matching_n_bands
+action_matching_similarity_threshold = params.action_matching_similarity_threshold
 
 full_network_layout = params.full_network_layout
 projection_graph_layout = params.projection_graph_layout
@@ -62,57 +96,139 @@ distribution_alpha = params.distribution_alpha
 hist_bar_width = params.hist_bar_width
 
 save_path_base = params.save_path_base
+render_manifest_path = params.render_manifest_path
+n_render_workers = params.n_render_workers
+render_previews = params.render_previews
 network_vis_save_base = params.network_vis_save_name
 degree_dists_save_base = params.degree_dists_save_name
 node_and_link_type_histograms_save_base = params.node_and_link_type_histograms_save_name
 projection_graph_vis_save_base = params.projection_graph_vis_save_name
 projection_graph_density_histogram_save_name = params.projection_graph_density_histogram_save_name
-
-degree_dists_per_node_type = [[] for node_type in node_types]
-
-counts = {}
-projection_graph_densities = [[] for spanning_node_type in projection_graph_spanning_node_types]
-projection_graph_densities_without_linkless = [[] for spanning_node_type in projection_graph_spanning_node_types]
-
-for municipality_tag in municipality_tags:
-    nodes,links,_ = nc.read_municipality_data(data_folder, municipality_tag, municipality_name_key=municipality_name_key, action_key=action_key, action_attributes=action_attributes, indicator_level_key=indicator_level_key, indicator_type_key=indicator_type_key, indicator_key=indicator_key, indicator_attributes=indicator_attributes, action_to_indicator_link_key=action_to_indicator_link_key, action_neighbour_key= action_neighbour_key, indicator_to_indicator_link_key=indicator_to_indicator_link_key, indicator_neighbour_key=indicator_neighbour_key)
-    G = nc.construct_network(nodes, links, municipality_tag)
-    network_vis_save_name = network_vis_save_base + '_' + municipality_tag + '.pdf'
-    vis.draw_network(G, layout=full_network_layout, node_type_key=node_type_key, node_colors=node_colors, node_markers=node_markers, node_size=node_size, edge_width=edge_width, edge_alpha=edge_alpha, arrow_size=arrow_size, save_path_base=save_path_base, save_name=network_vis_save_name)
-    degree_dists = na.calculate_degree_distributions(G, node_types, node_type_key, n_degree_bins)
-    for degree_dist_per_node_type, degree_dist in zip(degree_dists_per_node_type, degree_dists):
-        if len(degree_dist[0]) > 0:
-            degree_dist_per_node_type.append(degree_dist)
-    count = na.count_node_and_link_types(G, node_types, node_type_key)
-    for key in count:
-        if key in counts.keys():
-            counts[key].append(count[key])
+action_matching_network_vis_save_name = params.action_matching_network_vis_save_name
+
+# the analysis runs only in the main process; worker processes of community detection and rendering
+# re-import this script on platforms that spawn new processes
+if __name__ == '__main__':
+    degree_dists_per_node_type = [[] for node_type in node_types]
+    degree_dist_bands_per_node_type = [[] for node_type in node_types]
+
+    counts = {}
+    projection_graph_densities = [[] for spanning_node_type in projection_graph_spanning_node_types]
+    projection_graph_densities_without_linkless = [[] for spanning_node_type in projection_graph_spanning_node_types]
+    nodes_per_municipality = {}
+    render_jobs = []
+    projection_graphs = {spanning_node_type:{} for spanning_node_type in projection_graph_spanning_node_types}
+    networks = {}
+
+    def read_data(municipality_tag):
+        """
+        Reads the nodes and links of a municipality from the corpus or from the .json files.
+        """
+        if use_corpus:
+            nodes,links,_ = nc.read_corpus(corpus_path, [municipality_tag])[municipality_tag]
         else:
-            counts[key] = [count[key]]
-    for i, spanning_node_type in enumerate(projection_graph_spanning_node_types):
-        action_graph = nc.create_projection_graph(G,spanning_node_type,node_type_key) # TODO: add saving of projection graphs?
-        projection_graph_densities[i].append(nx.density(action_graph))
-        projection_graph_densities_without_linkless[i].append(na.calculate_density_without_linkless_nodes(G))
-        action_graph_vis_save_name = projection_graph_vis_save_base + '_' + spanning_node_type + '_' + municipality_tag + '.pdf'
-        vis.draw_network(action_graph, layout=projection_graph_layout, node_type_key=node_type_key, node_colors=node_colors, node_markers=node_markers, node_size=node_size, edge_width=edge_width, edge_alpha=edge_alpha, save_path_base=save_path_base, save_name=action_graph_vis_save_name)
-
-for degree_dist_per_node_type, node_type in zip(degree_dists_per_node_type, node_types):
-    if len(degree_dist_per_node_type) > 0:
-        save_path = save_path_base + '/' + degree_dists_save_base + '_' + node_type + '.pdf'
-        vis.plot_curves(degree_dist_per_node_type, normalize=False, x_label='Degree', y_label='PDF', colors=node_colors[node_type], line_style=line_style, line_width=line_width, alpha=distribution_alpha, save_path=save_path)
-        # re-plotting degree distributions with normalized x axis. Note that for municipalities where all nodes have degree 0, this leads to negative x values
-        save_path = save_path_base + '/' + degree_dists_save_base + '_' + node_type + '_normalized.pdf'
-        vis.plot_curves(degree_dist_per_node_type, normalize=True, x_label='Degree', y_label='PDF', colors=node_colors[node_type], line_style=line_style, line_width=line_width, alpha=distribution_alpha, save_path=save_path)
-
-vis.visualize_node_and_link_type_count(counts, bin_type=node_and_link_type_histogram_bin_type, nbins=n_type_histogram_bins, bar_width=hist_bar_width, save_path_base=save_path_base, save_name=node_and_link_type_histograms_save_base)
-
-for spanning_node_type, density, density_without_linkless in zip(projection_graph_spanning_node_types, projection_graph_densities, projection_graph_densities_without_linkless):
-    save_path = save_path_base + '/' + projection_graph_density_histogram_save_name + '_' + spanning_node_type + '.pdf'
-    vis.create_histogram(density, bin_type=projection_graph_density_bin_type, nbins=n_projection_graph_density_bins, bar_width=hist_bar_width, x_label='Density', y_label='Count', save_path=save_path)
-    print('Projection graph densities for spanning node type {}:'.format(spanning_node_type))
-    print(density)
-
-    save_path = save_path_base + '/' + projection_graph_density_histogram_save_name + '_without_linkless_' + spanning_node_type + '.pdf'
-    vis.create_histogram(density_without_linkless, bin_type=projection_graph_density_bin_type, nbins=n_projection_graph_density_bins, bar_width=hist_bar_width, x_label='Density', y_label='Count', save_path=save_path)
-    print('Projection graph densities for spanning node type {}, only nodes with degree > 0:'.format(spanning_node_type))
-    print(density_without_linkless)
+            nodes,links,_ = nc.read_municipality_data(data_folder, municipality_tag, municipality_name_key=municipality_name_key, action_key=action_key, action_attributes=action_attributes, indicator_level_key=indicator_level_key, indicator_type_key=indicator_type_key, indicator_key=indicator_key, indicator_attributes=indicator_attributes, action_to_indicator_link_key=action_to_indicator_link_key, action_neighbour_key= action_neighbour_key, indicator_to_indicator_link_key=indicator_to_indicator_link_key, indicator_neighbour_key=indicator_neighbour_key)
+        return nodes, links
+
+    def get_data_modification_time(municipality_tag):
+        """
+        Returns the latest modification time of the data files of a municipality.
+        """
+        if use_corpus:
+            return os.path.getmtime(corpus_path)
+        return max(os.path.getmtime(data_folder + '/' + tag + '.json') for tag in municipality_tag.split('+'))
+
+    for municipality_tag in municipality_tags:
+        nodes,links = read_data(municipality_tag)
+        G = nc.construct_network(nodes, links, municipality_tag, interned_attributes=interned_attributes, attribute_tables=attribute_tables)
+        nodes_per_municipality[municipality_tag] = [{node:node_attributes} for node, node_attributes in G.nodes(data=True)] # refers to the interned attributes of G instead of keeping the original nodes alive
+        networks[municipality_tag] = G
+        network_vis_save_name = network_vis_save_base + '_' + municipality_tag + '.pdf'
+        render_jobs.append(rq.create_render_job('draw_network', G=G, layout=full_network_layout, node_type_key=node_type_key, node_colors=node_colors, node_markers=node_markers, node_size=node_size, edge_width=edge_width, edge_alpha=edge_alpha, arrow_size=arrow_size, save_path_base=save_path_base, save_name=network_vis_save_name))
+        degree_dists = na.calculate_degree_distribution_confidence_intervals(G, node_types, node_type_key, n_degree_bins, n_bootstrap=n_bootstrap, confidence_level=confidence_level, seed=bootstrap_seed)
+        for degree_dist_per_node_type, degree_dist_bands, (bin_centers, degree_dist, lower, upper) in zip(degree_dists_per_node_type, degree_dist_bands_per_node_type, degree_dists):
+            if len(bin_centers) > 0:
+                degree_dist_per_node_type.append((bin_centers, degree_dist))
+                degree_dist_bands.append((lower, upper))
+        count = na.count_node_and_link_types(G, node_types, node_type_key)
+        for key in count:
+            if key in counts.keys():
+                counts[key].append(count[key])
+            else:
+                counts[key] = [count[key]]
+        for i, spanning_node_type in enumerate(projection_graph_spanning_node_types):
+            action_graph = nc.create_projection_graph(G,spanning_node_type,node_type_key) # TODO: add saving of projection graphs?
+            projection_graphs[spanning_node_type][municipality_tag] = action_graph
+            projection_graph_densities[i].append(nx.density(action_graph))
+            projection_graph_densities_without_linkless[i].append(na.calculate_density_without_linkless_nodes(G))
+            action_graph_vis_save_name = projection_graph_vis_save_base + '_' + spanning_node_type + '_' + municipality_tag + '.pdf'
+            render_jobs.append(rq.create_render_job('draw_network', G=action_graph, layout=projection_graph_layout, node_type_key=node_type_key, node_colors=node_colors, node_markers=node_markers, node_size=node_size, edge_width=edge_width, edge_alpha=edge_alpha, save_path_base=save_path_base, save_name=action_graph_vis_save_name))
+
+    for degree_dist_per_node_type, degree_dist_bands, node_type in zip(degree_dists_per_node_type, degree_dist_bands_per_node_type, node_types):
+        if len(degree_dist_per_node_type) > 0:
+            save_path = save_path_base + '/' + degree_dists_save_base + '_' + node_type + '.pdf'
+            render_jobs.append(rq.create_render_job('plot_curves', data=degree_dist_per_node_type, normalize=False, x_label='Degree', y_label='PDF', colors=node_colors[node_type], line_style=line_style, line_width=line_width, alpha=distribution_alpha, error_bands=degree_dist_bands, save_path=save_path))
+            # re-plotting degree distributions with normalized x axis. Note that for municipalities where all nodes have degree 0, this leads to negative x values
+            save_path = save_path_base + '/' + degree_dists_save_base + '_' + node_type + '_normalized.pdf'
+            render_jobs.append(rq.create_render_job('plot_curves', data=degree_dist_per_node_type, normalize=True, x_label='Degree', y_label='PDF', colors=node_colors[node_type], line_style=line_style, line_width=line_width, alpha=distribution_alpha, error_bands=degree_dist_bands, save_path=save_path))
+
+    count_confidence_intervals = na.calculate_type_count_confidence_intervals(counts, n_bootstrap=n_bootstrap, confidence_level=confidence_level, seed=bootstrap_seed)
+    for histogram_parameters in vis.get_node_and_link_type_histogram_parameters(counts, bin_type=node_and_link_type_histogram_bin_type, nbins=n_type_histogram_bins, bar_width=hist_bar_width, confidence_intervals=count_confidence_intervals, save_path_base=save_path_base, save_name=node_and_link_type_histograms_save_base):
+        render_jobs.append(rq.create_render_job('create_histogram', **histogram_parameters))
+    for key in counts:
+        print('Mean count of type {} and its {} confidence interval: {}'.format(key, confidence_level, count_confidence_intervals[key]))
+
+    for spanning_node_type, density, density_without_linkless in zip(projection_graph_spanning_node_types, projection_graph_densities, projection_graph_densities_without_linkless):
+        density_confidence_interval = na.bootstrap_confidence_interval(density, n_bootstrap=n_bootstrap, confidence_level=confidence_level, seed=bootstrap_seed)
+        save_path = save_path_base + '/' + projection_graph_density_histogram_save_name + '_' + spanning_node_type + '.pdf'
+        render_jobs.append(rq.create_render_job('create_histogram', data=density, bin_type=projection_graph_density_bin_type, nbins=n_projection_graph_density_bins, bar_width=hist_bar_width, x_label='Density', y_label='Count', confidence_interval=density_confidence_interval, save_path=save_path))
+        print('Projection graph densities for spanning node type {}:'.format(spanning_node_type))
+        print(density)
+        print('Mean density and its {} confidence interval: {}'.format(confidence_level, density_confidence_interval))
+
+        density_confidence_interval = na.bootstrap_confidence_interval(density_without_linkless, n_bootstrap=n_bootstrap, confidence_level=confidence_level, seed=bootstrap_seed)
+        save_path = save_path_base + '/' + projection_graph_density_histogram_save_name + '_without_linkless_' + spanning_node_type + '.pdf'
+        render_jobs.append(rq.create_render_job('create_histogram', data=density_without_linkless, bin_type=projection_graph_density_bin_type, nbins=n_projection_graph_density_bins, bar_width=hist_bar_width, x_label='Density', y_label='Count', confidence_interval=density_confidence_interval, save_path=save_path))
+        print('Projection graph densities for spanning node type {}, only nodes with degree > 0:'.format(spanning_node_type))
+        print(density_without_linkless)
+        print('Mean density and its {} confidence interval: {}'.format(confidence_level, density_confidence_interval))
+
+    for spanning_node_type in projection_graph_spanning_node_types:
+        communities = cd.detect_communities(projection_graphs[spanning_node_type], resolutions=community_resolutions, n_workers=n_community_detection_workers, seed=community_detection_seed)
+        for municipality_tag in communities:
+            print('Communities of projection graph of spanning node type {}, {}:'.format(spanning_node_type, municipality_tag))
+            for resolution, partition, modularity in communities[municipality_tag]:
+                print('resolution {}: {} communities, modularity {}'.format(resolution, len(partition), modularity))
+
+    # parameters that change the constructed snapshots; a saved store is valid only if they haven't changed
+    snapshot_store_metadata = {'use_corpus':use_corpus, 'action_attributes':action_attributes, 'indicator_attributes':indicator_attributes, 'interned_attributes':interned_attributes}
+    for snapshot_tags in plan_snapshot_tags:
+        # reusing the saved store unless the data of some snapshot or the parameters have changed after saving it
+        snapshot_store_path = save_path_base + '/' + snapshot_store_save_base + '_' + snapshot_tags[0] + '.pickle'
+        snapshot_store = None
+        if os.path.isfile(snapshot_store_path) and os.path.getmtime(snapshot_store_path) > max(get_data_modification_time(snapshot_tag) for snapshot_tag in snapshot_tags):
+            snapshot_store = nc.read_snapshot_store(snapshot_store_path)
+            if snapshot_store['labels'] != snapshot_tags or snapshot_store.get('metadata') != snapshot_store_metadata:
+                snapshot_store = None
+        if snapshot_store is None:
+            snapshots = []
+            for snapshot_tag in snapshot_tags:
+                if snapshot_tag in networks: # already constructed for the per-municipality analysis
+                    snapshots.append(networks[snapshot_tag])
+                else:
+                    nodes,links = read_data(snapshot_tag)
+                    snapshots.append(nc.construct_network(nodes, links, snapshot_tag, interned_attributes=interned_attributes, attribute_tables=attribute_tables))
+            snapshot_store = nc.create_snapshot_store(snapshots, snapshot_tags, save_path=snapshot_store_path, metadata=snapshot_store_metadata)
+        time_series = na.calculate_metric_time_series(snapshot_store, node_types, node_type_key, n_degree_bins)
+        print('Node and link type counts of snapshots {}:'.format(snapshot_tags))
+        print(time_series['counts'])
+        print('Densities of snapshots {}:'.format(snapshot_tags))
+        print(time_series['density'])
+
+    action_matching_network = am.construct_action_matching_network(nodes_per_municipality, node_type_key=node_type_key, text_attributes=action_matching_text_attributes, shingle_length=action_matching_shingle_length, n_hashes=action_matching_n_hashes, n_bands=action_matching_n_bands, similarity_threshold=action_matching_similarity_threshold)
+    action_matching_network_vis_save_name = action_matching_network_vis_save_name + '.pdf'
+    render_jobs.append(rq.create_render_job('draw_network', G=action_matching_network, layout=projection_graph_layout, node_type_key=node_type_key, node_colors=node_colors, node_markers=node_markers, node_size=node_size, edge_width='weight', edge_alpha=edge_alpha, save_path_base=save_path_base, save_name=action_matching_network_vis_save_name))
+    print('Density of the cross-municipality action matching network, only nodes with degree > 0:')
+    print(na.calculate_density_without_linkless_nodes(action_matching_network))
+
+    rq.run_render_queue(render_jobs, render_manifest_path, n_workers=n_render_workers, preview=render_previews)
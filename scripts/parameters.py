@@ -15,6 +15,9 @@ action_to_indicator_link_key ='relatedActions'
 action_neighbour_key ='action'
 indicator_to_indicator_link_key ='relatedCauses'
 indicator_neighbour_key ='causalIndicator'
+corpus_path = data_folder + '/corpus.cwn'
+use_corpus = False # if True, the frontend reads the data from the corpus written by construct_networks.py
+interned_attributes = ['responsibleParties','categories','contactPersons','organization']
 
 # network analysis
 node_type_key = 'node_type'
@@ -25,7 +28,25 @@ n_type_histogram_bins = 10
 n_projection_graph_density_bins = 5
 node_and_link_type_histogram_bin_type = 'logarithmic'
 projection_graph_density_bin_type = 'linear'
+n_bootstrap = 5000 # number of bootstrap samples for confidence intervals
+confidence_level = 0.95
+bootstrap_seed = 0
+community_resolutions = [0.5, 1., 1.5, 2.]
+n_community_detection_workers = None # None: use all CPUs
+community_detection_seed = 0
+plan_snapshot_tags = [['helsinki-kierto', 'helsinki-kierto-2023']] # successive versions of the same plan, in temporal order
 
+# cross-municipality action matching
+action_matching_text_attributes = ['name','description']
+action_matching_shingle_length = 5
+action_matching_n_hashes = 128
+action_matching_n_bands = 32
+action_matching_similarity_threshold = 0.5
+
+
+# analysis service
+service_host = '127.0.0.1' # only local connections
+service_port = 8050
 
 # visualization
 full_network_layout = 'graphviz'
@@ -42,8 +63,13 @@ distribution_alpha = 0.5
 hist_bar_width = 0.75
 
 save_path_base = '/home/onerva/projects/climate_watch/results/'
+render_manifest_path = save_path_base + 'render_manifest.json' # keys of rendered figures; figures with unchanged inputs are not re-rendered
+n_render_workers = None # None: use all CPUs
+render_previews = False # if True, figures are rendered as .png previews instead of .pdf
 network_vis_save_name = 'network'
 degree_dists_save_name = 'degree_distributions'
 node_and_link_type_histograms_save_name = 'type_histogram'
 projection_graph_vis_save_name = 'projection-graph'
 projection_graph_density_histogram_save_name = 'projection_graph_density'
+snapshot_store_save_name = 'snapshot_store'
+action_matching_network_vis_save_name = 'action-matching-network'
@@ -14,7 +14,7 @@ network_analysis = importlib.util.module_from_spec(spec)
 spec.loader.exec_module(network_analysis)
 
 
-def draw_network(G, node_type_key='node_type', layout='graphviz', node_colors={}, node_markers={}, node_size=50, edge_width=1, edge_alpha=0.5, arrow_size=5, save_path_base='', save_name=''):
+def draw_network(G, node_type_key='node_type', layout='graphviz', node_colors={}, node_markers={}, node_size=50, edge_width=1, edge_alpha=0.5, arrow_size=5, save_path_base='', save_name='', save_format='pdf'):
     """
     Visualizes the network and saves the plot as pdf. If save path is not given, the figure is shown instead of saving.
 
@@ -31,6 +31,7 @@ def draw_network(G, node_type_key='node_type', layout='graphviz', node_colors={}
     arrow_size: int, size of the arrowheads in the visualization
     save_path_base: str, a base path (e.g. to a shared folder) for saving figures
     save_name: str, name of the file where to save the network visualization
+    save_format: str, file format of the saved visualization (e.g. 'pdf' or 'png')
 
     Returns:
     --------
@@ -70,13 +71,13 @@ def draw_network(G, node_type_key='node_type', layout='graphviz', node_colors={}
     if save_path_base:
         assert len(save_name)>0, 'Give a file name for saving the visualization!'
         save_path = save_path_base + '/' + save_name
-        plt.savefig(save_path, format='pdf', bbox_inches='tight')
+        plt.savefig(save_path, format=save_format, bbox_inches='tight')
         plt.close()
     else:
         plt.show()
         plt.close()
 
-def plot_curves(data, normalize=False, x_label='', y_label='', labels=[], colors='b', markers='', line_style='-', line_width=1.5, alpha=0.5, save_path=''):
+def plot_curves(data, normalize=False, x_label='', y_label='', labels=[], colors='b', markers='', line_style='-', line_width=1.5, alpha=0.5, error_bands=[], save_path='', save_format='pdf'):
     """
     Plots the given distributions and saves them into a .pdf file
 
@@ -92,7 +93,10 @@ def plot_curves(data, normalize=False, x_label='', y_label='', labels=[], colors
     line_style: str, line style of the curves
     line_width: float, line widht of the curves
     alpha: float, transparency of the visualization
+    error_bands: list of tuples of lists, lower and upper limits of the error band (e.g. a confidence interval)
+                 of each curve; if empty, no error bands are drawn
     save_path: str, path to which to save the figure
+    save_format: str, file format of the saved figure (e.g. 'pdf' or 'png')
 
     Returns:
     --------
@@ -109,6 +113,13 @@ def plot_curves(data, normalize=False, x_label='', y_label='', labels=[], colors
     assert len(colors) == len(data), "Length of colors list don't match length of data, please check or give a scalar value"
     assert len(markers) == len(data), "Length of markers list don't match length of data, please check or give a scalar value"
 
+    if len(error_bands) > 0:
+        assert len(error_bands) == len(data), "Length of error bands list don't match length of data, please check"
+        for (x, y), (lower, upper), color in zip(data, error_bands, colors):
+            if normalize:
+                x = x/max(x)
+            plt.fill_between(x, lower, upper, color=color, alpha=0.5*alpha, linewidth=0)
+
     if len(labels) > 0:
         if not isinstance(labels, list):
             labels = [labels for i in range(len(data))]
@@ -130,13 +141,13 @@ def plot_curves(data, normalize=False, x_label='', y_label='', labels=[], colors
         ax.set_ylabel(y_label)
 
     if save_path:
-        plt.savefig(save_path, format='pdf', bbox_inches='tight')
+        plt.savefig(save_path, format=save_format, bbox_inches='tight')
         plt.close()
     else:
         plt.show()
         plt.close()
 
-def visualize_node_and_link_type_count(counts, bin_type='logarithmic', nbins=10, color='b',bar_width=0.75, save_path_base='', save_name=''):
+def visualize_node_and_link_type_count(counts, bin_type='logarithmic', nbins=10, color='b',bar_width=0.75, confidence_intervals={}, save_path_base='', save_name='', save_format='pdf'):
     """
     Visualizes the count of node and link types as a histogram and saves
     the visualization as pdf. Node and link types that don't appear in the data
@@ -149,28 +160,52 @@ def visualize_node_and_link_type_count(counts, bin_type='logarithmic', nbins=10,
     nbins: int, number of bins
     color: str, color of the histogram bars
     bar_width: dbl, widht of the histogram bars
+    confidence_intervals: dict, (estimate, lower, upper) of each type (keys: types; see
+                          network_analysis.calculate_type_count_confidence_intervals); if empty, no
+                          confidence intervals are drawn
     save_path_base: str, path to which save the visualization
     save_name: str, base name for the file to which to save the visualization, this base will
                     be combined with each node and link type to form the actual
                     file name
+    save_format: str, file format of the saved visualizations (e.g. 'pdf' or 'png')
 
     Returns:
     --------
     no direct output, saves the visualization in a pdf file
     """
+    histogram_parameters = get_node_and_link_type_histogram_parameters(counts, bin_type=bin_type, nbins=nbins, color=color, bar_width=bar_width, confidence_intervals=confidence_intervals, save_path_base=save_path_base, save_name=save_name, save_format=save_format)
+    for parameters in histogram_parameters:
+        create_histogram(**parameters)
+
+def get_node_and_link_type_histogram_parameters(counts, bin_type='logarithmic', nbins=10, color='b',bar_width=0.75, confidence_intervals={}, save_path_base='', save_name='', save_format='pdf'):
+    """
+    Returns the parameters of create_histogram for each node and link type histogram drawn by
+    visualize_node_and_link_type_count, e.g. for rendering the histograms through render_queue.
+    Node and link types that don't appear in the data are omitted.
+
+    Parameters:
+    -----------
+    see visualize_node_and_link_type_count
+
+    Returns:
+    --------
+    histogram_parameters: list of dicts, keyword arguments of create_histogram for each histogram
+    """
     if save_path_base:
         assert len(save_name) > 0, 'Please give file name for saving the node and link type histograms'
+    histogram_parameters = []
     for key in counts:
         data = counts[key]
         if np.max(data) > 0:
             if save_path_base:
-                save_path = save_path_base + '/' + save_name + '_' + key + '.pdf'
+                save_path = save_path_base + '/' + save_name + '_' + key + '.' + save_format
             else:
                 save_path = ''
-            create_histogram(data, bin_type=bin_type, nbins=nbins, color=color, bar_width=bar_width,
-                x_label='Number of nodes/links of type {}'.format(key), y_label='Count', save_path=save_path)
+            histogram_parameters.append(dict(data=data, bin_type=bin_type, nbins=nbins, color=color, bar_width=bar_width,
+                x_label='Number of nodes/links of type {}'.format(key), y_label='Count', confidence_interval=confidence_intervals.get(key, ()), save_path=save_path, save_format=save_format))
+    return histogram_parameters
 
-def create_histogram(data, bin_type='linear', nbins=10, color='b',bar_width=0.75, x_label='', y_label='', save_path=''):
+def create_histogram(data, bin_type='linear', nbins=10, color='b',bar_width=0.75, x_label='', y_label='', confidence_interval=(), save_path='', save_format='pdf'):
     """
     Creates a histogram of the given data, visualizes it, and optionally saves it as a pdf file.
 
@@ -183,7 +218,10 @@ def create_histogram(data, bin_type='linear', nbins=10, color='b',bar_width=0.75
     bar_width: dbl, width of the histogram bars
     x_label: str, label of the x axis
     y_label: str, label of the y axis
+    confidence_interval: tuple, (estimate, lower, upper) of a statistic of the data (e.g. the mean), drawn
+                         as a vertical line and a shaded band; if empty, nothing is drawn
     save_path: str, path to which save the visualization
+    save_format: str, file format of the saved visualization (e.g. 'pdf' or 'png')
 
     Returns:
     --------
@@ -206,12 +244,17 @@ def create_histogram(data, bin_type='linear', nbins=10, color='b',bar_width=0.75
 
     ax.hist(data, bins, color=color, rwidth=bar_width)
 
+    if len(confidence_interval) > 0:
+        estimate, lower, upper = confidence_interval
+        ax.axvspan(lower, upper, color='k', alpha=0.2, linewidth=0)
+        ax.axvline(estimate, color='k', linestyle='--')
+
     ax.set_xlabel(x_label)
     ax.set_ylabel(y_label)
     plt.tight_layout()
 
     if save_path:
-        plt.savefig(save_path, format='pdf', bbox_inches='tight')
+        plt.savefig(save_path, format=save_format, bbox_inches='tight')
         plt.close()
     else:
         plt.show()